@@ -0,0 +1,209 @@
+import io
+import mmap
+from pathlib import Path
+import posixpath
+import struct
+import tarfile
+import threading
+import xml.etree.ElementTree as ET
+import zipfile
+
+from remote_source import RemoteFile, is_url, remote_cache
+
+
+# File dialog entry for archived collections
+ARCHIVE_FILETYPES = ("Archived Collections", "*.zip *.tar *.tar.gz *.tgz *.tar.bz2 *.tar.xz")
+
+# Size of the fixed part of a zip local file header, followed by the file name and extra field
+ZIP_LOCAL_HEADER_SIZE = 30
+
+
+def is_archive(path):
+    """Return True if the path is a zip or tar archive rather than a collection XML file."""
+    path = Path(path)
+    if path.suffix.lower() == ".xml":
+        return False
+    return zipfile.is_zipfile(path) or tarfile.is_tarfile(path)
+
+
+def resolve_collection_path(collection_path, relative_path):
+    """Resolve an <image> or <source> path against the collection folder or archive.
+
+    Entries that are http(s) URLs are fetched from the server instead.
+    """
+    if is_url(relative_path):
+        return RemoteFile(relative_path, remote_cache())
+    if isinstance(collection_path, CollectionArchive):
+        return collection_path.member(relative_path)
+    return collection_path / Path(relative_path)
+
+
+class MemberStream(io.RawIOBase):
+    """Seekable read only stream over a slice of a memory mapped archive."""
+
+    def __init__(self, view):
+        self._view = view
+        self._position = 0
+
+    def readable(self):
+        return True
+
+    def seekable(self):
+        return True
+
+    def readinto(self, buffer):
+        data = self._view[self._position:self._position + len(buffer)]
+        size = len(data)
+        buffer[:size] = data
+        self._position += size
+        return size
+
+    def seek(self, offset, whence=io.SEEK_SET):
+        if whence == io.SEEK_SET:
+            position = offset
+        elif whence == io.SEEK_CUR:
+            position = self._position + offset
+        elif whence == io.SEEK_END:
+            position = len(self._view) + offset
+        else:
+            raise ValueError(f"Invalid whence {whence}")
+        if position < 0:
+            raise ValueError(f"Negative seek position {position}")
+        self._position = position
+        return position
+
+    def tell(self):
+        return self._position
+
+    def close(self):
+        if not self.closed:
+            self._view.release()
+        super().close()
+
+
+class ArchiveMember:
+    """A file inside a collection archive, used in place of a Path."""
+
+    def __init__(self, archive, name):
+        self.archive = archive
+        self.name = name
+
+    def open(self):
+        """Open the member for reading as a seekable binary stream."""
+        return self.archive.open_member(self.name)
+
+    def media_url(self):
+        """Return an FFmpeg URL that plays the member directly from the archive."""
+        return self.archive.media_url(self.name)
+
+    def __str__(self):
+        return f"{self.archive.path}/{self.name}"
+
+
+class CollectionArchive:
+    """A zip or tar archive holding a collection XML and its images or videos.
+
+    Members are read in place without extracting anything. Members stored
+    uncompressed are served straight from a memory map of the archive. Compressed
+    zip members are decompressed as they are streamed, while members of a
+    compressed tar are decompressed into memory when opened.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        self.collection_dir = ""
+        self._zip = None
+        self._tar = None
+        self._file = None
+        self._mmap = None
+        self._compressed_tar = False
+        # Streams of a compressed tar share one decompressor, which mustn't be read concurrently
+        self._tar_lock = threading.Lock()
+        # Member name -> (offset, size) of the uncompressed member data in the archive
+        self._stored = {}
+
+        if zipfile.is_zipfile(self.path):
+            self._zip = zipfile.ZipFile(self.path)
+            self.members = {posixpath.normpath(info.filename): info for info in self._zip.infolist() if not info.is_dir()}
+        else:
+            try:
+                # An uncompressed tar can be memory mapped, a compressed one can only be streamed
+                self._tar = tarfile.open(self.path, "r:")
+            except tarfile.ReadError:
+                self._tar = tarfile.open(self.path, "r:*")
+                self._compressed_tar = True
+            self.members = {posixpath.normpath(info.name): info for info in self._tar.getmembers() if info.isfile()}
+        self._index_stored_members()
+
+    def _index_stored_members(self):
+        if self._compressed_tar:
+            return
+        self._file = open(self.path, 'rb')
+        self._mmap = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        for name, info in self.members.items():
+            if self._zip is not None:
+                if info.compress_type != zipfile.ZIP_STORED or info.flag_bits & 0x1:
+                    continue
+                header = self._mmap[info.header_offset:info.header_offset + ZIP_LOCAL_HEADER_SIZE]
+                name_length, extra_length = struct.unpack("<HH", header[26:30])
+                offset = info.header_offset + ZIP_LOCAL_HEADER_SIZE + name_length + extra_length
+                self._stored[name] = (offset, info.file_size)
+            elif not info.sparse:
+                self._stored[name] = (info.offset_data, info.size)
+
+    def read_collection(self, item_tag):
+        """Locate the collection XML with <item_tag> entries and return its content.
+
+        Paths in the collection are resolved relative to the XML's folder in the archive.
+        """
+        for name in sorted(self.members, key=lambda name: (name.count("/"), name)):
+            if not name.lower().endswith(".xml"):
+                continue
+            with self.open_member(name) as fp:
+                xml_content = fp.read().decode("utf-8")
+            try:
+                root = ET.fromstring(xml_content)
+            except ET.ParseError:
+                continue
+            if root.find(item_tag) is not None:
+                self.collection_dir = posixpath.dirname(name)
+                return xml_content
+        raise FileNotFoundError(f"No collection XML found in {self.path}")
+
+    def member(self, relative_path):
+        """Return the member at the path relative to the collection XML."""
+        name = posixpath.normpath(posixpath.join(self.collection_dir, relative_path.replace("\\", "/")))
+        if name not in self.members:
+            raise FileNotFoundError(f"{relative_path} not found in {self.path}")
+        return ArchiveMember(self, name)
+
+    def open_member(self, name):
+        if name in self._stored:
+            offset, size = self._stored[name]
+            return MemberStream(memoryview(self._mmap)[offset:offset + size])
+        if self._zip is not None:
+            return self._zip.open(self.members[name])
+        # Read the whole member under the lock so that concurrent readers, e.g. the
+        # slideshow's transition thread, don't interleave on the shared decompressor
+        with self._tar_lock:
+            return io.BytesIO(self._tar.extractfile(self.members[name]).read())
+
+    def media_url(self, name):
+        if name not in self._stored:
+            raise ValueError(f"{name} is compressed in {self.path} and can't be played without extracting it")
+        offset, size = self._stored[name]
+        return f"subfile,,start,{offset},end,{offset + size},,:{self.path}"
+
+    def close(self):
+        if self._zip is not None:
+            self._zip.close()
+        if self._tar is not None:
+            self._tar.close()
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                # Streams over the map are still open; it is released once they are
+                pass
+        if self._file is not None:
+            self._file.close()
@@ -0,0 +1,361 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import json
+import os
+from pathlib import Path
+import sys
+import xml.etree.ElementTree as ET
+
+import numpy as np
+from PIL import Image
+
+from remote_source import RemoteFile, is_url, prefetch, remote_cache
+
+
+# Hashes are computed from the low frequency DCT coefficients of a reduced grayscale image
+DCT_SIZE = 32
+HASH_SIZE = 8
+HASH_BITS = HASH_SIZE * HASH_SIZE
+
+# Default cache of computed hashes, keyed by image path, modification time and size. It is
+# kept apart from the remote file cache so that it is never evicted along with downloads.
+HASH_CACHE_PATH = Path.home() / ".image_viewer_hashes" / "perceptual_hashes.json"
+
+# Maximum number of differing bits for two images to count as near duplicates
+DEFAULT_THRESHOLD = 6
+
+# Collections up to this many distinct hashes are compared all against all, larger ones through a multi-index
+BRUTE_FORCE_LIMIT = 20000
+
+# Number of hash pairs compared at once when comparing all against all
+BRUTE_FORCE_BATCH = 4 * 1024 * 1024
+
+# Number of matching pairs collected before merging them into the groups
+PAIR_BATCH = 1024 * 1024
+
+
+def dct_matrix(size):
+    """Return the orthonormal DCT-II matrix of the given size."""
+    k = np.arange(size)[:, None]
+    n = np.arange(size)[None, :]
+    matrix = np.cos(np.pi * (2 * n + 1) * k / (2 * size)) * np.sqrt(2 / size)
+    matrix[0] /= np.sqrt(2)
+    return matrix
+
+
+DCT_MATRIX = dct_matrix(DCT_SIZE)
+
+
+def perceptual_hash(image_path):
+    """Return the 64 bit DCT perceptual hash of an image.
+
+    JPEGs are decoded at a reduced scale, which is much faster than decoding the
+    full image only to shrink it to a few pixels. The DC coefficient is left out
+    of the median as it only reflects the average brightness and would skew it.
+    """
+    with Image.open(image_path) as image:
+        image.draft("L", (DCT_SIZE, DCT_SIZE))
+        image = image.convert("L").resize((DCT_SIZE, DCT_SIZE), Image.Resampling.LANCZOS)
+        pixels = np.asarray(image, dtype=np.float64)
+    coefficients = (DCT_MATRIX @ pixels @ DCT_MATRIX.T)[:HASH_SIZE, :HASH_SIZE]
+    bits = np.packbits((coefficients > np.median(coefficients.ravel()[1:])).ravel())
+    return int(bits.view(">u8")[0])
+
+
+def read_collection(collection_path):
+    """Read an image collection and return its XML root and (picture element, image path) entries.
+
+    Remote images are all queued for download before waiting on any of them, so
+    they are fetched in parallel by the cache's prefetch workers. Remote images
+    that fail to download are reported and get None as their image path.
+    """
+    collection_path = Path(collection_path)
+    with open(collection_path, 'r', encoding="utf-8") as fp:
+        root = ET.fromstring(fp.read())
+    entries = []
+    for picture in root.findall('picture'):
+        image = picture.find('image').text
+        if is_url(image):
+            image_path = RemoteFile(image, remote_cache())
+        else:
+            image_path = (collection_path.parent / Path(image)).resolve()
+        entries.append((picture, image_path))
+    prefetch([image_path for _, image_path in entries])
+    for i, (picture, image_path) in enumerate(entries):
+        if isinstance(image_path, RemoteFile):
+            try:
+                entries[i] = (picture, image_path.fetch())
+            except Exception as e:
+                print(f"Failed to fetch {image_path}: {e}", file=sys.stderr)
+                entries[i] = (picture, None)
+    return root, entries
+
+
+def load_hash_cache(cache_path):
+    try:
+        with open(cache_path, 'r', encoding="utf-8") as fp:
+            return json.load(fp)
+    except (OSError, ValueError):
+        return {}
+
+
+def save_hash_cache(cache_path, cache):
+    cache_path = Path(cache_path)
+    cache_path.parent.mkdir(parents=True, exist_ok=True)
+    temp_path = cache_path.with_name(cache_path.name + ".part")
+    with open(temp_path, 'w', encoding="utf-8") as fp:
+        json.dump(cache, fp)
+    os.replace(temp_path, cache_path)
+
+
+def compute_hashes(image_paths, cache_path=HASH_CACHE_PATH, workers=None):
+    """Return the perceptual hashes of the images as a uint64 array, computed in a process pool.
+
+    Hashes of images that haven't changed since they were last hashed are taken from
+    the cache. Images that fail to load are reported and marked False in the returned
+    validity mask, as are None paths of images that couldn't be fetched.
+    """
+    cache = load_hash_cache(cache_path)
+    hashes = np.zeros(len(image_paths), dtype=np.uint64)
+    valid = np.ones(len(image_paths), dtype=bool)
+    pending = []
+    for i, image_path in enumerate(image_paths):
+        if image_path is None:
+            valid[i] = False
+            continue
+        try:
+            stat = os.stat(image_path)
+        except OSError as e:
+            print(f"Failed to read {image_path}: {e}", file=sys.stderr)
+            valid[i] = False
+            continue
+        key = [stat.st_mtime_ns, stat.st_size]
+        cached = cache.get(str(image_path))
+        if cached is not None and cached[:2] == key:
+            hashes[i] = int(cached[2], 16)
+        else:
+            pending.append((i, key))
+
+    if pending:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            jobs = [executor.submit(perceptual_hash, image_paths[i]) for i, _ in pending]
+            for (i, key), job in zip(pending, jobs):
+                try:
+                    hashes[i] = job.result()
+                except Exception as e:
+                    print(f"Failed to hash {image_paths[i]}: {e}", file=sys.stderr)
+                    valid[i] = False
+                    continue
+                cache[str(image_paths[i])] = key + [f"{int(hashes[i]):016x}"]
+        save_hash_cache(cache_path, cache)
+    return hashes, valid
+
+
+def hamming_distances(a, b):
+    """Return the number of differing bits between the hashes, element wise."""
+    return np.bitwise_count(np.bitwise_xor(a, b))
+
+
+def brute_force_pairs(hashes, threshold):
+    """Yield batches of (firsts, seconds) index arrays of all pairs within the threshold.
+
+    Every hash is compared against every later one, a bounded number of rows at a time.
+    """
+    count = len(hashes)
+    batch = max(1, BRUTE_FORCE_BATCH // max(count, 1))
+    for start in range(0, count, batch):
+        rows = hashes[start:start + batch]
+        distances = hamming_distances(rows[:, None], hashes[None, start:])
+        i, j = np.nonzero(distances <= threshold)
+        i += start
+        j += start
+        later = j > i
+        yield i[later], j[later]
+
+
+def multi_index_pairs(hashes, threshold):
+    """Yield batches of (firsts, seconds) index arrays of all pairs within the threshold.
+
+    The hashes are split into threshold + 1 blocks. Two hashes within the threshold
+    must agree exactly on at least one block, so only hashes sharing a block value
+    are compared, all against all within the bucket. Pairs agreeing on several
+    blocks are found once per block.
+    """
+    block_count = threshold + 1
+    boundaries = [HASH_BITS * block // block_count for block in range(block_count + 1)]
+    for low, high in zip(boundaries, boundaries[1:]):
+        keys = (hashes >> np.uint64(low)) & np.uint64((1 << (high - low)) - 1)
+        order = np.argsort(keys, kind="stable")
+        sorted_keys = keys[order]
+        run_starts = np.flatnonzero(np.r_[True, sorted_keys[1:] != sorted_keys[:-1]])
+        run_ends = np.r_[run_starts[1:], len(order)]
+        for run_start, run_end in zip(run_starts, run_ends):
+            if run_end - run_start < 2:
+                continue
+            members = np.sort(order[run_start:run_end])
+            for i, j in brute_force_pairs(hashes[members], threshold):
+                yield members[i], members[j]
+
+
+def compress_parents(parents):
+    """Point every element of a union-find parent array straight at its root."""
+    while True:
+        grandparents = parents[parents]
+        if np.array_equal(grandparents, parents):
+            return
+        parents[:] = grandparents
+
+
+def union_pairs(parents, firsts, seconds):
+    """Merge the sets holding each pair of elements.
+
+    Roots are always hooked under a smaller root, so every element's parent is at
+    or below itself and a root is the smallest element of its set.
+    """
+    while len(firsts):
+        compress_parents(parents)
+        first_roots, second_roots = parents[firsts], parents[seconds]
+        apart = first_roots != second_roots
+        firsts, seconds = firsts[apart], seconds[apart]
+        first_roots, second_roots = first_roots[apart], second_roots[apart]
+        np.minimum.at(parents, np.maximum(first_roots, second_roots), np.minimum(first_roots, second_roots))
+    compress_parents(parents)
+
+
+def find_duplicate_groups(hashes, threshold=DEFAULT_THRESHOLD):
+    """Group the hashes into sets of near duplicates.
+
+    Returns lists of indices, each in ascending order, for groups of two or more,
+    ordered by their first index.
+    """
+    if not 0 <= threshold < HASH_BITS:
+        raise ValueError(f"Threshold must be between 0 and {HASH_BITS - 1}, got {threshold}")
+
+    # Identical hashes always group together, so only the distinct ones are compared
+    distinct, inverse = np.unique(hashes, return_inverse=True)
+    if len(distinct) <= BRUTE_FORCE_LIMIT:
+        pairs = brute_force_pairs(distinct, threshold)
+    else:
+        pairs = multi_index_pairs(distinct, threshold)
+
+    # Union-find over the matching pairs, merging them in bounded batches as they are found
+    parents = np.arange(len(distinct))
+    pending = []
+    pending_count = 0
+    for firsts, seconds in pairs:
+        pending.append((firsts, seconds))
+        pending_count += len(firsts)
+        if pending_count >= PAIR_BATCH:
+            union_pairs(parents, *(np.concatenate(arrays) for arrays in zip(*pending)))
+            pending = []
+            pending_count = 0
+    if pending:
+        union_pairs(parents, *(np.concatenate(arrays) for arrays in zip(*pending)))
+
+    labels = parents[inverse.ravel()]
+    order = np.argsort(labels, kind="stable")
+    group_starts = np.flatnonzero(np.r_[True, labels[order][1:] != labels[order][:-1]])
+    groups = [group.tolist() for group in np.split(order, group_starts[1:]) if len(group) > 1]
+    groups.sort(key=lambda group: group[0])
+    return groups
+
+
+def split_groups(hashes, groups, threshold=DEFAULT_THRESHOLD):
+    """Split groups of near duplicates so that every member is within the threshold of the first.
+
+    Groups are connected through chains of matching pairs, so their ends can be far
+    more than the threshold apart. Each group is split by taking its first remaining
+    member as a leader, together with the remaining members within the threshold of
+    it, until no members are left. Groups of one are dropped.
+    """
+    split = []
+    for group in groups:
+        remaining = np.asarray(group)
+        while len(remaining) > 1:
+            close = hamming_distances(hashes[remaining[0]], hashes[remaining]) <= threshold
+            if close.sum() > 1:
+                split.append(remaining[close].tolist())
+            remaining = remaining[~close]
+    split.sort(key=lambda group: group[0])
+    return split
+
+
+def write_deduplicated_collection(output_path, title, roots, entries, duplicates):
+    """Write a collection holding every picture except the dropped duplicates.
+
+    Local image paths are rewritten relative to the new collection.
+    """
+    output_path = Path(output_path)
+    slideshow = ET.Element('slideshow')
+    ET.SubElement(slideshow, 'title').text = title
+    collection_copyright = roots[0].find('copyright')
+    if collection_copyright is not None:
+        slideshow.append(collection_copyright)
+    for i, (picture, image_path) in enumerate(entries):
+        if i in duplicates:
+            continue
+        image = picture.find('image')
+        if not is_url(image.text):
+            image.text = Path(os.path.relpath(image_path, output_path.resolve().parent)).as_posix()
+        slideshow.append(picture)
+    ET.indent(slideshow)
+    with open(output_path, 'w', encoding="utf-8") as fp:
+        fp.write('<?xml version="1.0" encoding="UTF-8" ?>\n')
+        fp.write('<?xml-stylesheet type="text/xsl" href="slideshow.xsl"?>\n')
+        fp.write('<!DOCTYPE slideshow SYSTEM "slideshow.dtd">\n')
+        fp.write(ET.tostring(slideshow, encoding="unicode"))
+        fp.write('\n')
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Find near duplicate images across image collections.")
+    parser.add_argument("collections", nargs="+", help="image collection XML files")
+    parser.add_argument("--threshold", type=int, default=DEFAULT_THRESHOLD,
+                        help="maximum number of differing hash bits for near duplicates")
+    parser.add_argument("--workers", type=int, default=None, help="number of parallel hashing processes")
+    parser.add_argument("--cache", default=HASH_CACHE_PATH, help="file caching the computed hashes")
+    parser.add_argument("--report", help="write the report to this file instead of the console")
+    parser.add_argument("--output", help="write a collection without the duplicates to this XML file")
+    args = parser.parse_args(argv)
+    if not 0 <= args.threshold < HASH_BITS:
+        parser.error(f"--threshold must be between 0 and {HASH_BITS - 1}")
+
+    roots = []
+    entries = []
+    for collection_path in args.collections:
+        root, collection_entries = read_collection(collection_path)
+        roots.append(root)
+        entries.extend(collection_entries)
+
+    hashes, valid = compute_hashes([image_path for _, image_path in entries], args.cache, args.workers)
+    valid_indices = np.flatnonzero(valid)
+    valid_hashes = hashes[valid_indices]
+    groups = [
+        [int(valid_indices[i]) for i in group]
+        for group in split_groups(valid_hashes, find_duplicate_groups(valid_hashes, args.threshold), args.threshold)
+    ]
+
+    lines = [f"{len(groups)} groups of near duplicates found in {len(entries)} images"]
+    for number, group in enumerate(groups, start=1):
+        lines.append("")
+        lines.append(f"Group {number}:")
+        for i in group:
+            distance = int(hamming_distances(hashes[group[0]], hashes[i]))
+            lines.append(f"  {entries[i][1]} (distance {distance})")
+    report = "\n".join(lines) + "\n"
+    if args.report:
+        with open(args.report, 'w', encoding="utf-8") as fp:
+            fp.write(report)
+    else:
+        print(report, end="")
+
+    if args.output:
+        # Keep the first image of each group, in collection order. Every other member is
+        # within the threshold of it, so only near duplicates of a kept image are dropped.
+        duplicates = {i for group in groups for i in group[1:]}
+        write_deduplicated_collection(args.output, roots[0].find('title').text, roots, entries, duplicates)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
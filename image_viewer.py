@@ -6,13 +6,62 @@ from pathlib import Path
 import tkinter as tk
 from tkinter import PhotoImage, filedialog, messagebox, simpledialog
 import sys
+import threading
+import time
 import xml.etree.ElementTree as ET
 
 from PIL import Image, ImageTk
 
+from collection_archive import ARCHIVE_FILETYPES, ArchiveMember, CollectionArchive, is_archive, resolve_collection_path
+from remote_source import RemoteFile, prefetch
+
+
+# Length and highest frame rate of slideshow crossfade transitions. Fewer frames are
+# used when the memory cap requires it, spread over the same length.
+TRANSITION_DURATION = 1.0
+TRANSITION_FPS = 25
+
+# Upper bound on the memory held by the precomputed frames of a transition, in bytes
+TRANSITION_MEMORY_CAP = 512 * 1024 * 1024
+
+# Number of upcoming images downloaded ahead of time from remote collections
+PREFETCH_COUNT = 3
+
+
+def open_image(image_path):
+    """Open a collection image, which is a file, a member of an archive or on a server."""
+    if isinstance(image_path, ArchiveMember):
+        return Image.open(image_path.open())
+    if isinstance(image_path, RemoteFile):
+        return Image.open(image_path.fetch())
+    return Image.open(image_path)
+
+
+def image_ready(image_path):
+    """Return True if the image can be opened without waiting on a server."""
+    return not isinstance(image_path, RemoteFile) or image_path.is_ready()
+
+
+def when_image_fetched(widget, image_path, callback):
+    """Fetch a remote image in the background and call back on the Tk thread with the finished future."""
+    future = image_path.fetch_async()
+
+    def poll():
+        if future.done():
+            callback(future)
+        else:
+            widget.after(50, poll)
+
+    poll()
+
+
+def upcoming_paths(images, index):
+    """Return the paths of the images to be shown from index on, wrapping around the collection."""
+    return [images[(index + offset) % len(images)].image_path for offset in range(PREFETCH_COUNT)]
+
 
 class Slideshow:
-    def __init__(self, root, image_collection, collection_name):
+    def __init__(self, root, image_collection, collection_name, transitions=False):
         # Initialize slideshow window
         self.root = tk.Toplevel(root)
         self.root.attributes("-fullscreen", True)  # Make it fullscreen
@@ -22,6 +71,19 @@ class Slideshow:
         self.parent = root  # Reference to the main window
         self.root.title(collection_name)
 
+        # Crossfade transition state. The blend frames for the next transition are
+        # computed in the background while the current slide is shown.
+        self.transitions = transitions
+        self.current_slide = None
+        self.next_slide = None
+        self.blend_frames = None
+        self.transition_frames = []
+        self.transition_index = None
+        self.transition_ready = False
+
+        # Index of the remote image being downloaded for display, if any
+        self.loading_index = None
+
         # Label to display images in the slideshow
         self.main_frame = tk.Frame(self.root)
         self.main_frame.pack(fill=tk.BOTH, expand=True)
@@ -49,6 +111,9 @@ class Slideshow:
         # Ask the user for the slideshow interval (in seconds)
         self.interval = self.get_slideshow_interval()
 
+        # Get the screen dimensions for resizing the images, leaving space for metadata
+        self.slide_size = (self.root.winfo_screenwidth(), self.root.winfo_screenheight() - 200)
+
         # Bind the Escape key to exit fullscreen mode
         self.root.bind("<Escape>", lambda event: self.exit_fullscreen())
 
@@ -75,53 +140,170 @@ class Slideshow:
             self.root.deiconify()  # Restore the main window
             return 3  # Fallback to default interval
 
-    def show_image(self, index):
+    def load_slide(self, index, local_path=None):
+        """Load the image at index resized to fit the screen.
+
+        With transitions enabled the image is centered on a black screen sized
+        canvas so that consecutive slides can be blended together. A remote image
+        that has already been fetched is opened from its local_path.
+        """
+        image = open_image(local_path or self.images[index].image_path)
+        image.thumbnail(self.slide_size)
+        if not self.transitions:
+            return image
+        slide = Image.new("RGB", self.slide_size, "black")
+        slide.paste(image.convert("RGB"), ((self.slide_size[0] - image.width) // 2, (self.slide_size[1] - image.height) // 2))
+        return slide
+
+    def show_image(self, index, local_path=None):
         """Display the current image based on index."""
+        self.loading_index = None
         try:
+            # Download a remote image in the background, showing a placeholder meanwhile
             image_path = self.images[index].image_path
-            image = Image.open(image_path)
-
-            # Get the screen dimensions for resizing the image
-            screen_width = self.root.winfo_screenwidth()
-            screen_height = self.root.winfo_screenheight() - 200  # Leave space for metadata
-
-            # Resize image to fit screen size
-            image.thumbnail((screen_width, screen_height))
+            if local_path is None and not image_ready(image_path):
+                self.loading_index = index
+                self.image_area.config(image="", text="Loading image...", fg="white")
+                self.show_metadata(index)
+                when_image_fetched(self.root, image_path, lambda future: self.show_fetched_image(index, future))
+                return
+
+            image = self.load_slide(index, local_path)
+            self.current_slide = image
             self.current_image = ImageTk.PhotoImage(image)
 
             # Update the label with the image
-            self.image_area.config(image=self.current_image)
-
-            # Get image metadata information
-            self.caption_text_label.config(text=self.images[index].image_caption)
-            self.date_label.config(text=self.images[index].image_date)
-            if self.images[index].image_asa is not None:
-                self.asa_label.config(text=f"ASA: {self.images[index].image_asa}")
-            else:
-                self.asa_label.config(text="")
-            self.location_label.config(text=self.images[index].image_location)
-            if self.images[index].roll_number is not None:
-                self.roll_number_label.config(text=f"{self.images[index].roll_number} of {self.images[index].roll_max}")
-            else:
-                self.roll_number_label.config(text="")
+            self.image_area.config(image=self.current_image, text="")
+            self.show_metadata(index)
         except Exception as e:
             # Display error if the image can't be loaded
             messagebox.showerror("Error", f"Failed to load image: {e}")
             self.exit_fullscreen()
 
+    def show_fetched_image(self, index, future):
+        """Display a remote image once it has been downloaded, unless the slideshow has moved on."""
+        if not self.running or self.loading_index != index:
+            return
+        if future.exception() is not None:
+            messagebox.showerror("Error", f"Failed to load image: {future.exception()}")
+            self.exit_fullscreen()
+            return
+        self.show_image(index, future.result())
+
+        # The transition to the next slide was held back until this slide was shown
+        if self.running and self.transitions and self.current_slide is not None and self.loading_index is None:
+            self.prepare_transition(self.current_index)
+
+    def show_metadata(self, index):
+        """Display the metadata of the image at index."""
+        self.caption_text_label.config(text=self.images[index].image_caption)
+        self.date_label.config(text=self.images[index].image_date)
+        if self.images[index].image_asa is not None:
+            self.asa_label.config(text=f"ASA: {self.images[index].image_asa}")
+        else:
+            self.asa_label.config(text="")
+        self.location_label.config(text=self.images[index].image_location)
+        if self.images[index].roll_number is not None:
+            self.roll_number_label.config(text=f"{self.images[index].roll_number} of {self.images[index].roll_max}")
+        else:
+            self.roll_number_label.config(text="")
+
     def schedule_next_image(self):
         """Schedule the next image after the current interval."""
         if self.running and self.images:
             # Update index to show the next image
             self.current_index = (self.current_index + 1) % len(self.images)
             self.root.after(self.interval * 1000, self.show_next_image)  # Delay in ms
+            prefetch(upcoming_paths(self.images, self.current_index))
+
+            # Compute the transition to the next image while the current one is shown. While
+            # the current image is still downloading, this is left to show_fetched_image.
+            if self.transitions and self.current_slide is not None and self.loading_index is None:
+                self.prepare_transition(self.current_index)
 
     def show_next_image(self):
         """Show the next image and schedule the next frame."""
         if self.running:
+            self.loading_index = None
+            if self.transition_index == self.current_index and self.transition_ready:
+                self.schedule_transition_frame(0, time.perf_counter())
+                return
+            # Hard cut if the transition couldn't be prepared in time
+            self.transition_index = None
             self.show_image(self.current_index)
             self.schedule_next_image()
 
+    def prepare_transition(self, index):
+        """Start computing the crossfade from the current slide to the slide at index."""
+        self.transition_index = index
+        self.next_slide = None
+        self.blend_frames = None
+        self.transition_frames = []
+        self.transition_ready = False
+        threading.Thread(target=self.blend_transition, args=(index, self.current_slide), daemon=True).start()
+        self.root.after(50, self.convert_transition_frames, index)
+
+    def blend_transition(self, index, current_slide):
+        """Compute the blend frames of a transition. Runs on a background thread.
+
+        The number of frames is reduced to keep them within the memory cap, falling
+        back to a hard cut if not even one blend frame fits.
+        """
+        try:
+            next_slide = self.load_slide(index)
+        except Exception as e:
+            print(f"Error preparing transition: {e}")
+            return
+        # Each frame is held both as a PIL image and as a Tk photo image, at 4 bytes per pixel each
+        frame_bytes = self.slide_size[0] * self.slide_size[1] * 8
+        frame_count = min(int(TRANSITION_DURATION * TRANSITION_FPS), TRANSITION_MEMORY_CAP // frame_bytes)
+        blend_frames = [
+            Image.blend(current_slide, next_slide, step / frame_count) for step in range(1, frame_count)
+        ]
+        if self.transition_index == index:
+            self.next_slide = next_slide
+            self.blend_frames = blend_frames
+
+    def convert_transition_frames(self, index):
+        """Convert the blend frames to Tk images one per call so the display stays responsive."""
+        if not self.running or self.transition_index != index:
+            return
+        if self.blend_frames is None:
+            self.root.after(50, self.convert_transition_frames, index)
+            return
+        if self.blend_frames:
+            self.transition_frames.append(ImageTk.PhotoImage(self.blend_frames.pop(0)))
+            self.root.after(1, self.convert_transition_frames, index)
+        else:
+            self.transition_frames.append(ImageTk.PhotoImage(self.next_slide))
+            self.transition_ready = True
+
+    def schedule_transition_frame(self, frame, start_time):
+        """Schedule a transition frame so that the frames are spread evenly over the transition."""
+        # Schedule against the start time so that delays don't accumulate
+        spacing = TRANSITION_DURATION / len(self.transition_frames)
+        delay = start_time + (frame + 1) * spacing - time.perf_counter()
+        self.root.after(max(1, int(delay * 1000)), self.play_transition, frame, start_time)
+
+    def play_transition(self, frame, start_time):
+        """Show a precomputed transition frame and schedule the next one."""
+        if not self.running:
+            return
+        self.image_area.config(image=self.transition_frames[frame])
+        if frame + 1 < len(self.transition_frames):
+            self.schedule_transition_frame(frame + 1, start_time)
+            return
+
+        # The last frame is the next slide itself
+        self.current_image = self.transition_frames[-1]
+        self.current_slide = self.next_slide
+        self.next_slide = None
+        self.transition_frames = []
+        self.transition_index = None
+        self.transition_ready = False
+        self.show_metadata(self.current_index)
+        self.schedule_next_image()
+
     def exit_fullscreen(self, event=None):
         """Stop the slideshow and exit fullscreen mode."""
         self.running = False
@@ -154,6 +336,7 @@ class ImageViewerApp:
 
         # Initialize image list and index
         self.collection_path = ""
+        self.collection_archive = None
         self.collection_images = []
         self.current_image_index = 0
 
@@ -208,6 +391,7 @@ class ImageViewerApp:
         self.menu_bar.add_command(label="Open", command=self.open_collection)
         self.menu_bar.add_command(label="Reset", command=self.reset_collection)
         self.menu_bar.add_command(label="Slideshow", command=self.start_slideshow)
+        self.menu_bar.add_command(label="Crossfade Slideshow", command=lambda: self.start_slideshow(transitions=True))
 
         self.root.config(menu=self.menu_bar)
 
@@ -299,27 +483,40 @@ class ImageViewerApp:
         """ Read the collection information and return a list of image information objects. """
         image_paths = []
         try:
-            with open(self.collection_path, 'r', encoding="utf-8") as fp:
-                xml_content = fp.read()
-                root = ET.fromstring(xml_content)
-                self.collection_name = root.find('title').text
-                for image in root.findall('picture'):
-                    image_info = ImageInfo(
-                        image_path=collection_path / Path(image.find('image').text),
-                        image_date=image.find('date').text,
-                        image_location=image.find('location').text,
-                        image_caption=image.find('caption').text,
-                        image_asa=image.find('asa').text if image.find('asa') is not None else None,
-                        roll_number=image.find('roll_num').text if image.find('roll_num') is not None else None,
-                        roll_max=image.find('roll_max').text if image.find('roll_max') is not None else None,
-                    )
-                    image_paths.append(image_info)
+            if is_archive(self.collection_path):
+                # Read the collection and its images straight from the archive
+                self.collection_archive = CollectionArchive(self.collection_path)
+                xml_content = self.collection_archive.read_collection('picture')
+                collection_path = self.collection_archive
+            else:
+                with open(self.collection_path, 'r', encoding="utf-8") as fp:
+                    xml_content = fp.read()
+            root = ET.fromstring(xml_content)
+            self.collection_name = root.find('title').text
+            for image in root.findall('picture'):
+                image_info = ImageInfo(
+                    image_path=resolve_collection_path(collection_path, image.find('image').text),
+                    image_date=image.find('date').text,
+                    image_location=image.find('location').text,
+                    image_caption=image.find('caption').text,
+                    image_asa=image.find('asa').text if image.find('asa') is not None else None,
+                    roll_number=image.find('roll_num').text if image.find('roll_num') is not None else None,
+                    roll_max=image.find('roll_max').text if image.find('roll_max') is not None else None,
+                )
+                image_paths.append(image_info)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to read collection: {e}")
         return image_paths
 
+    def close_collection_archive(self):
+        """Close the archive of the current collection, if it was read from one."""
+        if self.collection_archive is not None:
+            self.collection_archive.close()
+            self.collection_archive = None
+
     def reset_collection(self):
         """Clear the image list and reset the display."""
+        self.close_collection_archive()
         self.collection_images = []
         self.current_image_index = 0
         self.collection_path = ""
@@ -338,25 +535,34 @@ class ImageViewerApp:
         """Allow the user to open a collection of images."""
         self.collection_path = filedialog.askopenfilename(
             title="Select Image Collection",
-            filetypes=[("Slide Show Collections", "*.xml")],
+            filetypes=[("Slide Show Collections", "*.xml"), ARCHIVE_FILETYPES],
         )
         if self.collection_path:
+            self.close_collection_archive()
+
             # Add selected images to the list
             self.collection_images = self.retrieve_image_paths(Path(self.collection_path).parent)
             self.root.title(self.collection_name)
             self.current_image_index = 0
             self.show_image(self.current_image_index)
 
-    def show_image(self, index):
-        """Display an image at the given index."""
+    def show_image(self, index, local_path=None):
+        """Display an image at the given index, opening a fetched remote image from its local_path."""
         if not self.collection_images:
             self.image_area.config(image="", text="No Image Loaded")
             return
 
         try:
-            # Open the image and fit it within the available area
+            # Download a remote image in the background, showing a placeholder meanwhile
             image_path = self.collection_images[index].image_path
-            image = Image.open(image_path)
+            if local_path is None and not image_ready(image_path):
+                self.image_area.config(image="", text="Loading image...")
+                self.update_image_count_label()
+                when_image_fetched(self.root, image_path, lambda future: self.show_fetched_image(index, image_path, future))
+                return
+
+            # Open the image and fit it within the available area
+            image = open_image(local_path or image_path)
 
             # Get the size of the image area
             area_width = self.image_area.winfo_width()
@@ -384,10 +590,24 @@ class ImageViewerApp:
 
             # Update the image count label
             self.update_image_count_label()
+
+            # Start downloading the next images of a remote collection
+            prefetch(upcoming_paths(self.collection_images, index + 1))
         except Exception as e:
             # Show an error if the image fails to load
             messagebox.showerror("Error", f"Failed to load image {image_path}: {e}")
 
+    def show_fetched_image(self, index, image_path, future):
+        """Display a remote image once it has been downloaded, unless another image has been selected."""
+        if (not self.collection_images or self.current_image_index != index
+                or self.collection_images[index].image_path is not image_path):
+            return
+        if future.exception() is not None:
+            self.image_area.config(text="Failed To Load Image")
+            messagebox.showerror("Error", f"Failed to load image {image_path}: {future.exception()}")
+            return
+        self.show_image(index, future.result())
+
     def show_previous_image(self):
         """Display the previous image in the list."""
         if self.collection_images:
@@ -412,10 +632,10 @@ class ImageViewerApp:
         current_image = self.current_image_index + 1  # User-friendly, starting at 1
         self.image_count_label.config(text=f"Image {current_image} of {total_images}")
 
-    def start_slideshow(self):
-        """Start the slideshow of images."""
+    def start_slideshow(self, transitions=False):
+        """Start the slideshow of images, optionally crossfading between them."""
         if self.collection_images:
-            Slideshow(self.root, self.collection_images, self.collection_name)
+            Slideshow(self.root, self.collection_images, self.collection_name, transitions)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,361 @@
+from concurrent.futures import Future
+from contextlib import contextmanager
+import hashlib
+import http.client
+import json
+import os
+from pathlib import Path, PurePosixPath
+import queue
+import threading
+from urllib.parse import urlsplit
+
+
+# Local cache of files fetched from remote collections, and its size limit in bytes
+CACHE_DIRECTORY = Path.home() / ".image_viewer_cache"
+CACHE_MAX_BYTES = 2 * 1024 * 1024 * 1024
+
+# Size of each range request when downloading
+DOWNLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+
+# Size of the blocks written to the cache while reading a response
+WRITE_BLOCK_SIZE = 256 * 1024
+
+# Number of background threads prefetching upcoming files
+PREFETCH_WORKERS = 4
+
+# Seconds to wait on the server before giving up
+CONNECTION_TIMEOUT = 30
+
+
+def is_url(text):
+    """Return True if the collection entry is an http(s) URL rather than a file path."""
+    return urlsplit(text).scheme in ("http", "https")
+
+
+class ConnectionPool:
+    """Keep-alive HTTP connections reused across requests to the same server."""
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    def _acquire(self, scheme, netloc):
+        with self._lock:
+            idle = self._idle.get((scheme, netloc))
+            if idle:
+                return idle.pop()
+        if scheme == "https":
+            return http.client.HTTPSConnection(netloc, timeout=CONNECTION_TIMEOUT)
+        return http.client.HTTPConnection(netloc, timeout=CONNECTION_TIMEOUT)
+
+    def _release(self, scheme, netloc, connection):
+        with self._lock:
+            self._idle.setdefault((scheme, netloc), []).append(connection)
+
+    @contextmanager
+    def get(self, url, headers=None):
+        """Send a GET request and yield the response.
+
+        The connection goes back to the pool once the response has been read to
+        the end. A request on a pooled connection the server has since closed is
+        retried once on a new connection.
+        """
+        parts = urlsplit(url)
+        path = (parts.path or "/") + (f"?{parts.query}" if parts.query else "")
+        for attempt in range(2):
+            connection = self._acquire(parts.scheme, parts.netloc)
+            reused = connection.sock is not None
+            try:
+                connection.request("GET", path, headers=headers or {})
+                response = connection.getresponse()
+                break
+            except (http.client.HTTPException, OSError):
+                connection.close()
+                if not reused or attempt:
+                    raise
+
+        try:
+            yield response
+        except BaseException:
+            connection.close()
+            raise
+        if response.isclosed() and not response.will_close:
+            self._release(parts.scheme, parts.netloc, connection)
+        else:
+            connection.close()
+
+
+class RemoteCache:
+    """Size bounded on disk cache of remote files.
+
+    Files are downloaded with range requests so an interrupted download resumes
+    where it left off. A cached file is revalidated with the server the first time
+    it is used in a session and the least recently used files are evicted once the
+    cache grows over its size limit.
+    """
+
+    def __init__(self, directory=CACHE_DIRECTORY, max_bytes=CACHE_MAX_BYTES):
+        self.directory = Path(directory)
+        self.max_bytes = max_bytes
+        self.pool = ConnectionPool()
+        self._downloads = {}
+        self._validated = set()
+        self._lock = threading.Lock()
+        self._queue = queue.Queue()
+        for _ in range(PREFETCH_WORKERS):
+            threading.Thread(target=self._prefetch_worker, daemon=True).start()
+
+    def _paths(self, url):
+        digest = hashlib.sha1(url.encode("utf-8")).hexdigest()
+        suffix = PurePosixPath(urlsplit(url).path).suffix
+        return self.directory / f"{digest}{suffix}", self.directory / f"{digest}.meta.json"
+
+    def cached_path(self, url):
+        """Return the path of a completely downloaded copy of the URL, or None."""
+        data_path, meta_path = self._paths(url)
+        return data_path if self._read_meta(meta_path).get("complete") and data_path.is_file() else None
+
+    def is_ready(self, url):
+        """Return True if the URL can be fetched without contacting the server."""
+        with self._lock:
+            validated = url in self._validated
+        return validated and self.cached_path(url) is not None
+
+    def fetch_async(self, url):
+        """Fetch the URL on a background thread, returning a future for the local path."""
+        future = Future()
+
+        def run():
+            try:
+                future.set_result(self.fetch(url))
+            except Exception as e:
+                future.set_exception(e)
+
+        threading.Thread(target=run, daemon=True).start()
+        return future
+
+    def fetch(self, url):
+        """Return the path of an up to date local copy of the URL, downloading it if needed."""
+        with self._lock:
+            future = self._downloads.get(url)
+            if future is None:
+                future = self._downloads[url] = Future()
+                owner = True
+            else:
+                owner = False
+        if owner:
+            self._run(url, future)
+        return future.result()
+
+    def prefetch(self, url):
+        """Start downloading the URL in the background if it isn't already."""
+        with self._lock:
+            if url in self._downloads or url in self._validated:
+                return
+            future = self._downloads[url] = Future()
+        self._queue.put((url, future))
+
+    def _prefetch_worker(self):
+        while True:
+            url, future = self._queue.get()
+            self._run(url, future)
+
+    def _run(self, url, future):
+        try:
+            future.set_result(self._download(url))
+        except Exception as e:
+            future.set_exception(e)
+        finally:
+            with self._lock:
+                self._downloads.pop(url, None)
+
+    def _download(self, url):
+        self.directory.mkdir(parents=True, exist_ok=True)
+        data_path, meta_path = self._paths(url)
+        meta = self._read_meta(meta_path)
+
+        if meta.get("complete") and data_path.is_file():
+            if url not in self._validated:
+                self._revalidate(url, data_path, meta_path, meta)
+            os.utime(data_path)  # Mark as recently used for eviction
+            return data_path
+
+        # Resume a partial download only if the server can confirm the file is unchanged
+        part_path = data_path.with_name(data_path.name + ".part")
+        validator = meta.get("etag") or meta.get("last_modified")
+        offset = part_path.stat().st_size if part_path.is_file() and validator else 0
+        total = meta.get("size") if offset else None
+        while total is None or offset < total:
+            headers = {"Range": f"bytes={offset}-{offset + DOWNLOAD_CHUNK_SIZE - 1}"}
+            validator = meta.get("etag") or meta.get("last_modified")
+            if offset and validator:
+                headers["If-Range"] = validator
+            with self.pool.get(url, headers) as response:
+                if response.status == 206:
+                    total = int(response.getheader("Content-Range").rsplit("/", 1)[1])
+                    if not offset:
+                        meta = self._meta_from(response, total)
+                        self._write_meta(meta_path, meta)
+                    offset += self._write_response(response, part_path, "ab" if offset else "wb")
+                elif response.status == 200:
+                    # The server doesn't support ranges or the file changed since the partial download
+                    offset = total = self._write_response(response, part_path, "wb")
+                    meta = self._meta_from(response, total)
+                else:
+                    response.read()
+                    raise OSError(f"HTTP {response.status} {response.reason} fetching {url}")
+
+        os.replace(part_path, data_path)
+        meta["complete"] = True
+        self._write_meta(meta_path, meta)
+        with self._lock:
+            self._validated.add(url)
+        self._evict(keep=data_path)
+        return data_path
+
+    def _revalidate(self, url, data_path, meta_path, meta):
+        """Check a cached file is still current, downloading it again if it isn't.
+
+        If the server can't be reached the cached copy is used as is, and checked
+        again the next time it is fetched.
+        """
+        headers = {}
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+        try:
+            with self.pool.get(url, headers) as response:
+                if response.status == 304:
+                    response.read()
+                elif response.status == 200:
+                    part_path = data_path.with_name(data_path.name + ".part")
+                    size = self._write_response(response, part_path, "wb")
+                    os.replace(part_path, data_path)
+                    meta = self._meta_from(response, size)
+                    meta["complete"] = True
+                    self._write_meta(meta_path, meta)
+                else:
+                    response.read()
+                    raise OSError(f"HTTP {response.status} {response.reason} fetching {url}")
+        except (http.client.HTTPException, OSError) as e:
+            print(f"Using cached copy of {url}, unable to check it with the server: {e}")
+            return
+        with self._lock:
+            self._validated.add(url)
+
+    def _evict(self, keep):
+        """Remove the least recently used files until the cache fits in its size limit."""
+        with self._lock:
+            files = [
+                path for path in self.directory.iterdir()
+                if not path.name.endswith(".meta.json") and path.suffix != ".part"
+            ]
+            files.sort(key=lambda path: path.stat().st_mtime)
+            total = sum(path.stat().st_size for path in files)
+            for path in files:
+                if total <= self.max_bytes:
+                    break
+                if path == keep:
+                    continue
+                try:
+                    size = path.stat().st_size
+                    path.unlink()
+                    self.directory.joinpath(f"{path.name.split('.', 1)[0]}.meta.json").unlink(missing_ok=True)
+                except OSError:
+                    # Still open elsewhere, e.g. a video being played
+                    continue
+                total -= size
+
+    @staticmethod
+    def _write_response(response, path, mode):
+        """Stream the response body into the file and return the number of bytes written."""
+        written = 0
+        with open(path, mode) as fp:
+            while True:
+                block = response.read(WRITE_BLOCK_SIZE)
+                if not block:
+                    break
+                fp.write(block)
+                written += len(block)
+        return written
+
+    @staticmethod
+    def _meta_from(response, size):
+        return {
+            "etag": response.getheader("ETag"),
+            "last_modified": response.getheader("Last-Modified"),
+            "size": size,
+            "complete": False,
+        }
+
+    @staticmethod
+    def _read_meta(meta_path):
+        try:
+            with open(meta_path, 'r', encoding="utf-8") as fp:
+                return json.load(fp)
+        except (OSError, ValueError):
+            return {}
+
+    @staticmethod
+    def _write_meta(meta_path, meta):
+        with open(meta_path, 'w', encoding="utf-8") as fp:
+            json.dump(meta, fp)
+
+
+_remote_cache = None
+_remote_cache_lock = threading.Lock()
+
+
+def remote_cache():
+    """Return the cache shared by all remote files, creating it on first use."""
+    global _remote_cache
+    with _remote_cache_lock:
+        if _remote_cache is None:
+            _remote_cache = RemoteCache()
+        return _remote_cache
+
+
+class RemoteFile:
+    """A file on an HTTP server, used in place of a Path."""
+
+    def __init__(self, url, cache):
+        self.url = url
+        self.cache = cache
+
+    def fetch(self):
+        """Return the path of the locally cached copy, downloading it if needed."""
+        return self.cache.fetch(self.url)
+
+    def fetch_async(self):
+        """Fetch the file on a background thread, returning a future for the local path."""
+        return self.cache.fetch_async(self.url)
+
+    def is_ready(self):
+        """Return True if the file can be fetched without waiting on the server."""
+        return self.cache.is_ready(self.url)
+
+    def prefetch(self):
+        self.cache.prefetch(self.url)
+
+    def media_url(self):
+        """Return the cached copy if there is one, otherwise stream from the server.
+
+        FFmpeg streams over range requests, while the file is cached in the
+        background for the next time it is played.
+        """
+        cached_path = self.cache.cached_path(self.url)
+        if cached_path is not None:
+            return str(cached_path)
+        self.cache.prefetch(self.url)
+        return self.url
+
+    def __str__(self):
+        return self.url
+
+
+def prefetch(paths):
+    """Start downloading any remote files among the collection paths in the background."""
+    for path in paths:
+        if isinstance(path, RemoteFile):
+            path.prefetch()
@@ -0,0 +1,132 @@
+from contextlib import redirect_stderr
+import io
+import os
+import shutil
+import socket
+import tempfile
+import unittest
+from unittest import mock
+
+import numpy as np
+from PIL import Image
+
+import find_duplicates
+from find_duplicates import compute_hashes, find_duplicate_groups, hamming_distances, read_collection, split_groups
+from remote_source import RemoteCache
+
+
+def reference_groups(hashes, threshold):
+    """Group the hashes with a plain union-find over an all against all comparison."""
+    parents = list(range(len(hashes)))
+
+    def find(i):
+        while parents[i] != i:
+            i = parents[i]
+        return i
+
+    for i in range(len(hashes)):
+        for j in range(i + 1, len(hashes)):
+            if int(hamming_distances(hashes[i], hashes[j])) <= threshold:
+                root_i, root_j = find(i), find(j)
+                parents[max(root_i, root_j)] = min(root_i, root_j)
+    groups = {}
+    for i in range(len(hashes)):
+        groups.setdefault(find(i), []).append(i)
+    return [group for group in groups.values() if len(group) > 1]
+
+
+def synthetic_hashes(seed, count=150):
+    """Return random hashes mixed with copies that have a few bits flipped, and some exact copies."""
+    rng = np.random.default_rng(seed)
+    originals = rng.integers(0, 2 ** 63, count, dtype=np.uint64) | (rng.integers(0, 2, count, dtype=np.uint64) << np.uint64(63))
+    variants = originals.copy()
+    for _ in range(3):
+        flips = rng.random(count) < 0.7
+        variants[flips] ^= np.uint64(1) << rng.integers(0, 64, flips.sum(), dtype=np.uint64)
+    hashes = np.concatenate([originals, variants, originals[:10]])
+    rng.shuffle(hashes)
+    return hashes
+
+
+class FindDuplicateGroupsTest(unittest.TestCase):
+    def check_against_reference(self, hashes, threshold):
+        expected = reference_groups(hashes, threshold)
+        self.assertEqual(find_duplicate_groups(hashes, threshold), expected)
+        # Force the multi-index and merge the matching pairs in many small batches
+        with mock.patch.object(find_duplicates, "BRUTE_FORCE_LIMIT", 0), \
+                mock.patch.object(find_duplicates, "PAIR_BATCH", 7):
+            self.assertEqual(find_duplicate_groups(hashes, threshold), expected)
+
+    def test_groups_match_reference(self):
+        for seed, threshold in enumerate((0, 1, 3, 6, 10)):
+            with self.subTest(threshold=threshold):
+                self.check_against_reference(synthetic_hashes(seed), threshold)
+
+    def test_highest_threshold(self):
+        hashes = synthetic_hashes(5, count=40)
+        self.check_against_reference(hashes, 63)
+        # Only hashes differing in every bit are kept apart
+        complements = np.array([0x0123456789abcdef, ~np.uint64(0x0123456789abcdef)], dtype=np.uint64)
+        self.assertEqual(find_duplicate_groups(complements, 63), [])
+        self.assertEqual(find_duplicate_groups(np.concatenate([complements, [0]]).astype(np.uint64), 63), [[0, 1, 2]])
+
+    def test_small_batches_match_reference(self):
+        with mock.patch.object(find_duplicates, "BRUTE_FORCE_BATCH", 64):
+            self.check_against_reference(synthetic_hashes(7), 6)
+
+    def test_threshold_out_of_range(self):
+        hashes = synthetic_hashes(0, count=10)
+        for threshold in (-1, 64):
+            with self.subTest(threshold=threshold), self.assertRaises(ValueError):
+                find_duplicate_groups(hashes, threshold)
+
+    def test_no_hashes(self):
+        self.assertEqual(find_duplicate_groups(np.array([], dtype=np.uint64)), [])
+
+    def test_split_groups_keeps_members_within_threshold_of_first(self):
+        # A chain where each hash is one bit from the next, so the ends are 9 bits apart
+        chain = np.array([(1 << bits) - 1 for bits in range(10)], dtype=np.uint64)
+        groups = find_duplicate_groups(chain, 2)
+        self.assertEqual(groups, [list(range(10))])
+        split = split_groups(chain, groups, 2)
+        self.assertEqual(split, [[0, 1, 2], [3, 4, 5], [6, 7, 8]])
+        for group in split:
+            self.assertTrue(all(int(hamming_distances(chain[group[0]], chain[i])) <= 2 for i in group))
+
+
+class ReadCollectionTest(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_unreachable_remote_image_is_marked_invalid(self):
+        # A port nothing listens on
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        Image.new("RGB", (64, 64), "red").save(os.path.join(self.directory, "local.jpg"))
+        collection_path = os.path.join(self.directory, "collection.xml")
+        with open(collection_path, 'w', encoding="utf-8") as fp:
+            fp.write(
+                "<slideshow><title>Test</title>"
+                "<picture><image>local.jpg</image></picture>"
+                f"<picture><image>http://127.0.0.1:{port}/missing.jpg</image></picture>"
+                "</slideshow>"
+            )
+
+        cache = RemoteCache(os.path.join(self.directory, "cache"))
+        with mock.patch.object(find_duplicates, "remote_cache", lambda: cache), \
+                redirect_stderr(io.StringIO()) as errors:
+            _, entries = read_collection(collection_path)
+            hashes, valid = compute_hashes(
+                [image_path for _, image_path in entries], os.path.join(self.directory, "hashes.json"), workers=1
+            )
+        self.assertIsNone(entries[1][1])
+        self.assertIn("missing.jpg", errors.getvalue())
+        self.assertEqual(valid.tolist(), [True, False])
+
+
+if __name__ == "__main__":
+    unittest.main()
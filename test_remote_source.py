@@ -0,0 +1,222 @@
+from contextlib import redirect_stdout
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import hashlib
+import io
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest import mock
+
+import remote_source
+from remote_source import RemoteCache, RemoteFile
+
+
+class StandInHandler(BaseHTTPRequestHandler):
+    """Keep-alive file server supporting range, conditional and If-Range requests."""
+
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def do_GET(self):
+        server = self.server
+        server.requests.append((self.path, dict(self.headers), self.client_address))
+        if self.path in server.failing:
+            self.send_response(500)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+        body = server.files[self.path]
+        etag = '"%s"' % hashlib.md5(body).hexdigest()
+        if self.headers.get("If-None-Match") == etag:
+            self.send_response(304)
+            self.send_header("ETag", etag)
+            self.send_header("Content-Length", "0")
+            self.end_headers()
+            return
+
+        requested_range = self.headers.get("Range")
+        if_range = self.headers.get("If-Range")
+        if requested_range and server.ranges and if_range in (None, etag):
+            start, end = requested_range.split("=")[1].split("-")
+            start, end = int(start), min(int(end), len(body) - 1)
+            self.send_response(206)
+            self.send_header("Content-Range", f"bytes {start}-{end}/{len(body)}")
+            part = body[start:end + 1]
+        else:
+            self.send_response(200)
+            part = body
+        self.send_header("ETag", etag)
+        self.send_header("Content-Length", str(len(part)))
+        self.end_headers()
+        self.wfile.write(part)
+
+
+class RemoteCacheTest(unittest.TestCase):
+    def setUp(self):
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), StandInHandler)
+        self.server.daemon_threads = True
+        self.server.files = {
+            "/a.jpg": os.urandom(10000),
+            "/b.jpg": os.urandom(6000),
+            "/c.json": os.urandom(3000),
+        }
+        self.server.ranges = True
+        self.server.failing = set()
+        self.server.requests = []
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.base_url = f"http://127.0.0.1:{self.server.server_port}"
+        self.directory = tempfile.mkdtemp()
+        chunk_patch = mock.patch.object(remote_source, "DOWNLOAD_CHUNK_SIZE", 4000)
+        chunk_patch.start()
+        self.addCleanup(chunk_patch.stop)
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+        shutil.rmtree(self.directory)
+
+    def read(self, path):
+        with open(path, 'rb') as fp:
+            return fp.read()
+
+    def test_download_in_ranges_over_one_connection(self):
+        cache = RemoteCache(self.directory)
+        path = cache.fetch(self.base_url + "/a.jpg")
+        self.assertEqual(self.read(path), self.server.files["/a.jpg"])
+        ranges = [headers["Range"] for _, headers, _ in self.server.requests]
+        self.assertEqual(ranges, ["bytes=0-3999", "bytes=4000-7999", "bytes=8000-11999"])
+        self.assertEqual(len({client for _, _, client in self.server.requests}), 1)
+
+    def test_cached_file_is_revalidated_once_per_session(self):
+        RemoteCache(self.directory).fetch(self.base_url + "/a.jpg")
+        self.server.requests.clear()
+
+        cache = RemoteCache(self.directory)
+        path = cache.fetch(self.base_url + "/a.jpg")
+        cache.fetch(self.base_url + "/a.jpg")
+        self.assertEqual(len(self.server.requests), 1)
+        self.assertIn("If-None-Match", self.server.requests[0][1])
+        self.assertEqual(self.read(path), self.server.files["/a.jpg"])
+
+    def test_changed_file_is_downloaded_again(self):
+        RemoteCache(self.directory).fetch(self.base_url + "/a.jpg")
+        self.server.files["/a.jpg"] = os.urandom(5000)
+        path = RemoteCache(self.directory).fetch(self.base_url + "/a.jpg")
+        self.assertEqual(self.read(path), self.server.files["/a.jpg"])
+
+    def test_interrupted_download_resumes_with_if_range(self):
+        cache = RemoteCache(self.directory)
+        url = self.base_url + "/a.jpg"
+        original_write = RemoteCache._write_response
+
+        def fail_after_first_chunk(response, path, mode):
+            written = original_write(response, path, mode)
+            self.server.failing.add("/a.jpg")
+            return written
+
+        with mock.patch.object(RemoteCache, "_write_response", staticmethod(fail_after_first_chunk)):
+            with self.assertRaises(OSError):
+                cache.fetch(url)
+        self.server.failing.clear()
+        self.server.requests.clear()
+
+        path = RemoteCache(self.directory).fetch(url)
+        self.assertEqual(self.read(path), self.server.files["/a.jpg"])
+        _, first_headers, _ = self.server.requests[0]
+        self.assertEqual(first_headers["Range"], "bytes=4000-7999")
+        self.assertIn("If-Range", first_headers)
+
+    def test_resume_restarts_when_file_changed(self):
+        url = self.base_url + "/a.jpg"
+        cache = RemoteCache(self.directory)
+        original_write = RemoteCache._write_response
+
+        def fail_after_first_chunk(response, path, mode):
+            written = original_write(response, path, mode)
+            self.server.failing.add("/a.jpg")
+            return written
+
+        with mock.patch.object(RemoteCache, "_write_response", staticmethod(fail_after_first_chunk)):
+            with self.assertRaises(OSError):
+                cache.fetch(url)
+        self.server.failing.clear()
+        self.server.files["/a.jpg"] = os.urandom(9000)
+
+        path = RemoteCache(self.directory).fetch(url)
+        self.assertEqual(self.read(path), self.server.files["/a.jpg"])
+
+    def test_cached_file_is_used_while_server_is_down(self):
+        url = self.base_url + "/a.jpg"
+        RemoteCache(self.directory).fetch(url)
+        self.server.shutdown()
+        self.server.server_close()
+
+        cache = RemoteCache(self.directory)
+        with redirect_stdout(io.StringIO()) as output:
+            path = cache.fetch(url)
+        self.assertEqual(self.read(path), self.server.files["/a.jpg"])
+        self.assertIn("unable to check it with the server", output.getvalue())
+        # The copy is checked again on the next fetch rather than trusted for the session
+        self.assertFalse(cache.is_ready(url))
+
+    def test_cached_file_is_used_on_server_error(self):
+        url = self.base_url + "/a.jpg"
+        RemoteCache(self.directory).fetch(url)
+        self.server.failing.add("/a.jpg")
+
+        cache = RemoteCache(self.directory)
+        with redirect_stdout(io.StringIO()):
+            path = cache.fetch(url)
+        self.assertEqual(self.read(path), self.server.files["/a.jpg"])
+        self.assertFalse(cache.is_ready(url))
+
+        self.server.failing.clear()
+        cache.fetch(url)
+        self.assertTrue(cache.is_ready(url))
+
+    def test_server_without_range_support(self):
+        self.server.ranges = False
+        path = RemoteCache(self.directory).fetch(self.base_url + "/a.jpg")
+        self.assertEqual(self.read(path), self.server.files["/a.jpg"])
+        self.assertEqual(len(self.server.requests), 1)
+
+    def test_least_recently_used_files_are_evicted(self):
+        cache = RemoteCache(self.directory, max_bytes=17000)
+        first = cache.fetch(self.base_url + "/a.jpg")
+        second = cache.fetch(self.base_url + "/b.jpg")
+        # Make the second file the least recently used
+        os.utime(second, (0, 0))
+        third = cache.fetch(self.base_url + "/c.json")
+        self.assertTrue(first.is_file())
+        self.assertFalse(second.is_file())
+        self.assertTrue(third.is_file())
+        self.assertIsNone(cache.cached_path(self.base_url + "/b.jpg"))
+
+    def test_json_files_are_kept_apart_from_metadata(self):
+        cache = RemoteCache(self.directory)
+        path = cache.fetch(self.base_url + "/c.json")
+        self.assertEqual(self.read(path), self.server.files["/c.json"])
+        self.assertEqual(cache.cached_path(self.base_url + "/c.json"), path)
+
+    def test_remote_file_fetches_in_background(self):
+        remote_file = RemoteFile(self.base_url + "/b.jpg", RemoteCache(self.directory))
+        self.assertFalse(remote_file.is_ready())
+        path = remote_file.fetch_async().result(timeout=10)
+        self.assertTrue(remote_file.is_ready())
+        self.assertEqual(self.read(path), self.server.files["/b.jpg"])
+        self.assertEqual(remote_file.media_url(), str(path))
+
+    def test_prefetch_downloads_upcoming_files(self):
+        cache = RemoteCache(self.directory)
+        remote_source.prefetch([RemoteFile(self.base_url + name, cache) for name in ("/a.jpg", "/b.jpg")])
+        for name in ("/a.jpg", "/b.jpg"):
+            self.assertEqual(self.read(cache.fetch(self.base_url + name)), self.server.files[name])
+        self.assertEqual(len([path for path, _, _ in self.server.requests if path == "/b.jpg"]), 2)
+
+
+if __name__ == "__main__":
+    unittest.main()
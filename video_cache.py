@@ -0,0 +1,47 @@
+import glob
+import hashlib
+from pathlib import Path
+import re
+import sys
+
+
+# Proxies and seek indexes are stored next to their source video in a hidden directory
+PROXY_DIRECTORY = ".proxies"
+
+
+def cache_digest(video_path):
+    """Return the key of a video's cache files, taken from its name, modification time and size."""
+    video_path = Path(video_path)
+    stat = video_path.stat()
+    key = f"{video_path.name}:{stat.st_mtime_ns}:{stat.st_size}"
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:16]
+
+
+def cache_path_for(video_path, suffix):
+    """Return the path a file derived from a video would be cached at.
+
+    The file name holds the source name and its cache digest, so a changed source
+    never picks up a stale cache entry.
+    """
+    video_path = Path(video_path)
+    return video_path.parent / PROXY_DIRECTORY / f"{video_path.name}.{cache_digest(video_path)}{suffix}"
+
+
+def remove_stale_cache_files(video_path):
+    """Delete proxies and indexes left behind by earlier versions of a video."""
+    video_path = Path(video_path)
+    digest = cache_digest(video_path)
+    prefix = video_path.name + "."
+    for cache_path in (video_path.parent / PROXY_DIRECTORY).glob(glob.escape(prefix) + "*"):
+        match = re.match(r"([0-9a-f]{16})\.", cache_path.name[len(prefix):])
+        if match and match.group(1) != digest:
+            try:
+                cache_path.unlink()
+            except OSError as e:
+                print(f"Failed to remove stale cache file {cache_path}: {e}", file=sys.stderr)
+
+
+def fit_size(width, height, max_width, max_height):
+    """Scale a frame size to fit in the bounding box, keeping even dimensions for the encoder."""
+    scale = min(max_width / width, max_height / height, 1.0)
+    return max(2, int(width * scale) // 2 * 2), max(2, int(height * scale) // 2 * 2)
@@ -0,0 +1,125 @@
+import bisect
+from io import BytesIO
+import os
+from pathlib import Path
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from video_cache import cache_path_for, fit_size
+
+
+# Seconds between indexed timestamps
+INDEX_INTERVAL = 1.0
+
+# Bounding box and JPEG quality of the scrubbing preview thumbnails
+THUMBNAIL_WIDTH = 192
+THUMBNAIL_HEIGHT = 108
+THUMBNAIL_QUALITY = 75
+
+
+def index_path_for(video_path):
+    """Return the path the seek index for a video would be cached at."""
+    return cache_path_for(video_path, ".index.npz")
+
+
+class VideoIndex:
+    """Timestamp and thumbnail index of a video used for scrubbing.
+
+    Thumbnails are kept JPEG encoded, back to back in a single byte array, and
+    only decoded when shown.
+    """
+
+    def __init__(self, timestamps, thumbnail_data, thumbnail_offsets, duration):
+        self.timestamps = timestamps
+        self.thumbnail_data = thumbnail_data
+        self.thumbnail_offsets = thumbnail_offsets
+        self.duration = duration
+
+    @classmethod
+    def load_cached(cls, video_path):
+        """Return the cached index for a video, or None if it hasn't been built."""
+        try:
+            index_path = index_path_for(video_path)
+        except OSError:
+            return None
+        if not index_path.is_file():
+            return None
+        try:
+            return cls.load(index_path)
+        except Exception as e:
+            print(f"Error loading video index {index_path}: {e}")
+            return None
+
+    @classmethod
+    def load(cls, index_path):
+        with np.load(index_path) as data:
+            return cls(data['timestamps'], data['thumbnail_data'], data['thumbnail_offsets'], float(data['duration']))
+
+    def save(self, index_path):
+        index_path = Path(index_path)
+        index_path.parent.mkdir(exist_ok=True)
+        temp_path = index_path.with_name(index_path.name + ".part.npz")
+        np.savez(
+            temp_path, timestamps=self.timestamps, thumbnail_data=self.thumbnail_data,
+            thumbnail_offsets=self.thumbnail_offsets, duration=self.duration
+        )
+        os.replace(temp_path, index_path)
+
+    @classmethod
+    def build(cls, source_path):
+        """Build the index in a single pass over a video.
+
+        Pass the proxy of a video when there is one as it is much cheaper to decode.
+        Only the sampled frames are converted, resized and encoded.
+        """
+        capture = cv2.VideoCapture(str(source_path))
+        if not capture.isOpened():
+            raise RuntimeError(f"Unable to open video {source_path}")
+
+        timestamps = []
+        thumbnails = []
+        try:
+            width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+            height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+            thumbnail_size = fit_size(width, height, THUMBNAIL_WIDTH, THUMBNAIL_HEIGHT)
+            next_sample = 0.0
+            position = 0.0
+            while capture.grab():
+                position = capture.get(cv2.CAP_PROP_POS_MSEC) / 1000.0
+                if position < next_sample:
+                    continue
+                ok, frame = capture.retrieve()
+                if not ok:
+                    continue
+                frame = cv2.resize(frame, thumbnail_size, interpolation=cv2.INTER_AREA)
+                ok, encoded = cv2.imencode(".jpg", frame, [cv2.IMWRITE_JPEG_QUALITY, THUMBNAIL_QUALITY])
+                if not ok:
+                    continue
+                thumbnails.append(encoded.ravel())
+                timestamps.append(position)
+                next_sample = position + INDEX_INTERVAL
+        finally:
+            capture.release()
+
+        if not thumbnails:
+            raise RuntimeError(f"No frames could be read from {source_path}")
+        offsets = np.zeros(len(thumbnails) + 1, dtype=np.int64)
+        np.cumsum([len(thumbnail) for thumbnail in thumbnails], out=offsets[1:])
+        return cls(np.array(timestamps, dtype=np.float64), np.concatenate(thumbnails), offsets, position)
+
+    def nearest_index(self, position):
+        """Return the index of the entry closest to the position in seconds."""
+        i = bisect.bisect_left(self.timestamps, position)
+        if i == 0:
+            return 0
+        if i == len(self.timestamps):
+            return len(self.timestamps) - 1
+        return i if self.timestamps[i] - position < position - self.timestamps[i - 1] else i - 1
+
+    def thumbnail(self, position):
+        """Return the preview thumbnail closest to the position as a PIL image."""
+        i = self.nearest_index(position)
+        data = self.thumbnail_data[self.thumbnail_offsets[i]:self.thumbnail_offsets[i + 1]]
+        return Image.open(BytesIO(data.tobytes()))
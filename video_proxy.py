@@ -0,0 +1,163 @@
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import glob
+import os
+from pathlib import Path
+import sys
+import xml.etree.ElementTree as ET
+
+import cv2
+
+from remote_source import is_url
+from video_cache import cache_path_for, fit_size, remove_stale_cache_files
+from video_index import VideoIndex, index_path_for
+
+# Default bounding box for proxies, sized for the video viewer window
+DEFAULT_PROXY_WIDTH = 1280
+DEFAULT_PROXY_HEIGHT = 720
+
+
+def proxy_path_for(video_path, max_width=DEFAULT_PROXY_WIDTH, max_height=DEFAULT_PROXY_HEIGHT):
+    """Return the path the proxy for a video fitting the bounding box would be cached at."""
+    return cache_path_for(video_path, f".{max_width}x{max_height}.mp4")
+
+
+def find_proxy(video_path):
+    """Return the path of an up to date proxy for a video, or None if there is none.
+
+    If proxies have been generated for several bounding boxes the most recent one is used.
+    """
+    try:
+        prefix_path = cache_path_for(video_path, "")
+    except OSError:
+        return None
+    proxy_paths = [
+        proxy_path for proxy_path in prefix_path.parent.glob(glob.escape(prefix_path.name) + ".*x*.mp4")
+        if not proxy_path.name.endswith(".part.mp4")
+    ]
+    return max(proxy_paths, key=lambda proxy_path: proxy_path.stat().st_mtime) if proxy_paths else None
+
+
+def retrieve_video_sources(collection_path):
+    """Read a video collection and return the paths of its local source videos.
+
+    Remote sources are skipped, as proxies are only generated for local files.
+    """
+    collection_path = Path(collection_path)
+    with open(collection_path, 'r', encoding="utf-8") as fp:
+        root = ET.fromstring(fp.read())
+    sources = []
+    for video in root.findall('video'):
+        source = video.find('source').text
+        if is_url(source):
+            print(f"Skipping remote video {source}, proxies are only generated for local files")
+            continue
+        sources.append(collection_path.parent / Path(source))
+    return sources
+
+
+def generate_proxy(video_path, max_width=DEFAULT_PROXY_WIDTH, max_height=DEFAULT_PROXY_HEIGHT, force=False):
+    """Transcode a video to a reduced resolution proxy and return the proxy path.
+
+    The proxy holds the video stream only; the viewer plays audio from the original.
+    """
+    video_path = Path(video_path)
+    proxy_path = proxy_path_for(video_path, max_width, max_height)
+    if proxy_path.is_file() and not force:
+        return proxy_path
+    proxy_path.parent.mkdir(exist_ok=True)
+
+    capture = cv2.VideoCapture(str(video_path))
+    if not capture.isOpened():
+        raise RuntimeError(f"Unable to open video {video_path}")
+
+    # Write to a temporary file so an interrupted job never leaves a partial proxy behind
+    temp_path = proxy_path.with_suffix(".part.mp4")
+    writer = None
+    try:
+        fps = capture.get(cv2.CAP_PROP_FPS) or 30.0
+        width = int(capture.get(cv2.CAP_PROP_FRAME_WIDTH))
+        height = int(capture.get(cv2.CAP_PROP_FRAME_HEIGHT))
+        proxy_size = fit_size(width, height, max_width, max_height)
+        writer = cv2.VideoWriter(str(temp_path), cv2.VideoWriter_fourcc(*"mp4v"), fps, proxy_size)
+        if not writer.isOpened():
+            raise RuntimeError(f"Unable to create proxy {temp_path}")
+
+        while True:
+            ok, frame = capture.read()
+            if not ok:
+                break
+            if (frame.shape[1], frame.shape[0]) != proxy_size:
+                frame = cv2.resize(frame, proxy_size, interpolation=cv2.INTER_AREA)
+            writer.write(frame)
+    except Exception:
+        if writer is not None:
+            writer.release()
+            writer = None
+        temp_path.unlink(missing_ok=True)
+        raise
+    finally:
+        capture.release()
+        if writer is not None:
+            writer.release()
+
+    os.replace(temp_path, proxy_path)
+    remove_stale_cache_files(video_path)
+    return proxy_path
+
+
+def prepare_video(video_path, max_width=DEFAULT_PROXY_WIDTH, max_height=DEFAULT_PROXY_HEIGHT, force=False):
+    """Generate the proxy of a video and its seek index, returning the proxy path.
+
+    The index is built from the proxy, which is much cheaper to decode than the original.
+    """
+    proxy_path = generate_proxy(video_path, max_width, max_height, force)
+    index_path = index_path_for(video_path)
+    if force or not index_path.is_file():
+        VideoIndex.build(proxy_path).save(index_path)
+    return proxy_path
+
+
+def generate_collection_proxies(collection_paths, max_width=DEFAULT_PROXY_WIDTH, max_height=DEFAULT_PROXY_HEIGHT,
+                                workers=None, force=False):
+    """Generate proxies and seek indexes for every video in the collections, running jobs in parallel.
+
+    Returns the number of videos that failed.
+    """
+    sources = []
+    for collection_path in collection_paths:
+        for source in retrieve_video_sources(collection_path):
+            if source not in sources:
+                sources.append(source)
+
+    failures = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        jobs = {
+            executor.submit(prepare_video, source, max_width, max_height, force): source
+            for source in sources
+        }
+        for job in as_completed(jobs):
+            source = jobs[job]
+            try:
+                print(f"{source} -> {job.result()}")
+            except Exception as e:
+                failures += 1
+                print(f"Failed to generate proxy for {source}: {e}", file=sys.stderr)
+    return failures
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Generate low resolution proxies and seek indexes for video collections.")
+    parser.add_argument("collections", nargs="+", help="video collection XML files")
+    parser.add_argument("--width", type=int, default=DEFAULT_PROXY_WIDTH, help="maximum proxy width")
+    parser.add_argument("--height", type=int, default=DEFAULT_PROXY_HEIGHT, help="maximum proxy height")
+    parser.add_argument("--workers", type=int, default=None, help="number of parallel transcoding jobs")
+    parser.add_argument("--force", action="store_true", help="regenerate proxies and indexes that are already cached")
+    args = parser.parse_args(argv)
+
+    failures = generate_collection_proxies(args.collections, args.width, args.height, args.workers, args.force)
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
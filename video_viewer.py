@@ -11,6 +11,18 @@ import xml.etree.ElementTree as ET
 from ffpyplayer.player import MediaPlayer
 from PIL import Image, ImageTk
 
+from collection_archive import ARCHIVE_FILETYPES, ArchiveMember, CollectionArchive, is_archive, resolve_collection_path
+from remote_source import RemoteFile, prefetch
+from video_index import VideoIndex
+from video_proxy import find_proxy
+
+
+# Seconds skipped by the seek keys
+SEEK_STEP = 10
+
+# Milliseconds to wait after the last seek before refining it to the exact position
+SEEK_REFINE_DELAY = 250
+
 
 @dataclass
 class VideoInfo:
@@ -34,8 +46,13 @@ class VideoViewerApp:
 
         # Initialize image list and index
         self.mediaplayer_capture = None
+        self.mediaplayer_audio = None
         self.running_video = False
+        self.video_index = None
+        self.scrubbing = False
+        self.seek_refine_job = None
         self.collection_path = ""
+        self.collection_archive = None
         self.collection_videos = []
         self.current_video_index = 0
 
@@ -47,6 +64,8 @@ class VideoViewerApp:
         self.root.bind("<Left>", lambda event: self.show_previous_video())  # Left arrow
         self.root.bind("<Right>", lambda event: self.show_next_video())  # Right arrow
         self.root.bind("<Escape>", lambda event: self.show_first_video())  # Right arrow
+        self.root.bind("<Shift-Left>", lambda event: self.skip_video(-SEEK_STEP))  # Shift left arrow
+        self.root.bind("<Shift-Right>", lambda event: self.skip_video(SEEK_STEP))  # Shift right arrow
 
     def set_window_icon(self):
         """Set the window icon using an embedded base64 string."""
@@ -106,6 +125,17 @@ class VideoViewerApp:
         )
         self.video_area.pack(fill=tk.BOTH, expand=True)
 
+        # Preview thumbnail shown over the video while scrubbing
+        self.preview_label = tk.Label(self.video_area, bg="black")
+
+        # Seek bar for the current video, in seconds
+        self.seek_bar = tk.Scale(
+            self.main_frame, from_=0, to=0, orient=tk.HORIZONTAL, showvalue=False,
+            command=self.scrub_video, bg="lightgray", highlightthickness=0
+        )
+        self.seek_bar.bind("<ButtonPress-1>", self.start_scrubbing)
+        self.seek_bar.bind("<ButtonRelease-1>", self.stop_scrubbing)
+
         # Area for video metadata display
         self.video_metadata_frame = tk.Frame(self.main_frame, bg="lightgray", height=50)
         self.video_metadata_line1_frame = tk.Frame(self.video_metadata_frame, bg="lightgray")
@@ -117,6 +147,7 @@ class VideoViewerApp:
         self.location_label.pack(side=tk.RIGHT, padx=10)
         self.video_metadata_line1_frame.pack(side=tk.TOP, fill=tk.X)
         self.video_metadata_frame.pack(side=tk.BOTTOM, fill=tk.X)
+        self.seek_bar.pack(side=tk.BOTTOM, fill=tk.X)
 
         # Bottom frame to hold navigation buttons
         self.bottom_frame = tk.Frame(self.root, bg="lightgray", height=50)
@@ -174,28 +205,40 @@ class VideoViewerApp:
         """ Read the collection information and return a list of Video information objects. """
         video_paths = []
         try:
-            with open(self.collection_path, 'r', encoding="utf-8") as fp:
-                xml_content = fp.read()
-                root = ET.fromstring(xml_content)
-                self.collection_name = root.find('title').text
-                for video in root.findall('video'):
-                    video_info = VideoInfo(
-                        video_path=collection_path / Path(video.find('source').text),
-                        video_caption=video.find('caption').text,
-                        video_date=video.find('date').text if video.find('date') is not None else None,
-                        video_location=video.find('location').text if video.find('location') is not None else None,
-                    )
-                    video_paths.append(video_info)
+            if is_archive(self.collection_path):
+                # Read the collection and play its videos straight from the archive
+                self.collection_archive = CollectionArchive(self.collection_path)
+                xml_content = self.collection_archive.read_collection('video')
+                collection_path = self.collection_archive
+            else:
+                with open(self.collection_path, 'r', encoding="utf-8") as fp:
+                    xml_content = fp.read()
+            root = ET.fromstring(xml_content)
+            self.collection_name = root.find('title').text
+            for video in root.findall('video'):
+                video_info = VideoInfo(
+                    video_path=resolve_collection_path(collection_path, video.find('source').text),
+                    video_caption=video.find('caption').text,
+                    video_date=video.find('date').text if video.find('date') is not None else None,
+                    video_location=video.find('location').text if video.find('location') is not None else None,
+                )
+                video_paths.append(video_info)
         except Exception as e:
             messagebox.showerror("Error", f"Failed to read collection: {e}")
         return video_paths
 
+    def close_collection_archive(self):
+        """Close the archive of the current collection, if it was read from one."""
+        if self.collection_archive is not None:
+            self.collection_archive.close()
+            self.collection_archive = None
+
     def reset_collection(self):
         """Clear the video list and reset the display."""
-        if self.mediaplayer_capture is not None:
-            self.mediaplayer_capture.set_pause(True)
-            self.mediaplayer_capture.close_player()
-            self.mediaplayer_capture = None
+        self.release_media_players()
+        self.close_collection_archive()
+        self.video_index = None
+        self.seek_bar.config(to=0)
         self.collection_videos = []
         self.current_video_index = 0
         self.collection_path = ""
@@ -212,9 +255,12 @@ class VideoViewerApp:
         """Allow the user to open a collection of videos."""
         self.collection_path = filedialog.askopenfilename(
             title="Select Video Collection",
-            filetypes=[("Video Show Collection", "*.xml")],
+            filetypes=[("Video Show Collection", "*.xml"), ARCHIVE_FILETYPES],
         )
         if self.collection_path:
+            self.release_media_players()
+            self.close_collection_archive()
+
             # Add selected videos to the list
             self.collection_videos = self.retrieve_video_paths(Path(self.collection_path).parent)
             self.root.title(self.collection_name)
@@ -236,8 +282,7 @@ class VideoViewerApp:
             # Handle the frame
             if val == 'eof':
                 # Video ended. Release video and indicate done with this video
-                self.mediaplayer_capture.close_player()
-                self.mediaplayer_capture = None
+                self.release_media_players()
                 self.caption_text_label.config(text="Video playback ended.")
                 self.date_label.config(text="")
                 self.location_label.config(text="")
@@ -260,6 +305,9 @@ class VideoViewerApp:
                 self.current_video = ImageTk.PhotoImage(image=frame_image)
                 self.video_area.config(image=self.current_video, text="")
 
+                # Track the playback position on the seek bar
+                self.update_seek_bar(timer)
+
                 # Call this function again after a small delay (e.g., 1 milliseconds)
                 # to process the next frame and create a continuous loop
                 if self.running_video:
@@ -288,8 +336,30 @@ class VideoViewerApp:
             # Update the video count label
             self.update_video_count_label()
 
-            # Open up audio playback
-            self.mediaplayer_capture = MediaPlayer(str(video_path))
+            # Reset the seek bar for the new video
+            self.video_index = None
+            self.seek_bar.config(to=0)
+            self.seek_bar.set(0)
+
+            if isinstance(video_path, (ArchiveMember, RemoteFile)):
+                # Videos in an archive or on a server are played in place. They have no
+                # proxy or seek index as those are cached next to the video files.
+                self.mediaplayer_capture = MediaPlayer(video_path.media_url())
+            else:
+                # Use the seek index built by the proxy command, if there is one
+                self.video_index = VideoIndex.load_cached(video_path)
+
+                # Play a low resolution proxy if one has been generated, with the audio
+                # taken from the original since proxies hold the video stream only
+                proxy_path = find_proxy(video_path)
+                if proxy_path is not None:
+                    self.mediaplayer_capture = MediaPlayer(str(proxy_path), ff_opts={'an': True})
+                    self.mediaplayer_audio = MediaPlayer(str(video_path), ff_opts={'vn': True})
+                else:
+                    self.mediaplayer_capture = MediaPlayer(str(video_path))
+
+            # Start downloading the next video of a remote collection
+            prefetch([self.collection_videos[(index + 1) % len(self.collection_videos)].video_path])
 
             # Start the frame update process
             update_frame()
@@ -305,10 +375,7 @@ class VideoViewerApp:
 
         if self.collection_videos:
             # Clean up current video capture
-            if self.mediaplayer_capture is not None:
-                self.mediaplayer_capture.set_pause(True)
-                self.mediaplayer_capture.close_player()
-                self.mediaplayer_capture = None
+            self.release_media_players()
 
             self.current_video_index = (self.current_video_index - 1) % len(self.collection_videos)
 
@@ -322,10 +389,7 @@ class VideoViewerApp:
 
         if self.collection_videos:
             # Clean up current video capture
-            if self.mediaplayer_capture is not None:
-                self.mediaplayer_capture.set_pause(True)
-                self.mediaplayer_capture.close_player()
-                self.mediaplayer_capture = None
+            self.release_media_players()
 
             self.current_video_index = (self.current_video_index + 1) % len(self.collection_videos)
 
@@ -339,16 +403,90 @@ class VideoViewerApp:
 
         if self.collection_videos:
             # Clean up current video capture
-            if self.mediaplayer_capture is not None:
-                self.mediaplayer_capture.set_pause(True)
-                self.mediaplayer_capture.close_player()
-                self.mediaplayer_capture = None
+            self.release_media_players()
 
             self.current_video_index = 0
 
             # Give some time for the cleanup before starting the next video
             self.root.after(15, self.show_video, self.current_video_index)
 
+    def update_seek_bar(self, position):
+        """Move the seek bar to the playback position, sizing it once the duration is known."""
+        if not self.seek_bar.cget("to"):
+            duration = None
+            if self.video_index is not None:
+                duration = self.video_index.duration
+            elif self.mediaplayer_capture is not None:
+                duration = self.mediaplayer_capture.get_metadata().get('duration')
+            if duration:
+                self.seek_bar.config(to=int(duration))
+        if not self.scrubbing:
+            self.seek_bar.set(position)
+
+    def start_scrubbing(self, event):
+        """Start dragging the seek bar."""
+        self.scrubbing = True
+
+    def scrub_video(self, value):
+        """Show the preview thumbnail for the seek bar position while dragging."""
+        if not self.scrubbing or self.video_index is None:
+            return
+        self.current_preview = ImageTk.PhotoImage(self.video_index.thumbnail(float(value)))
+        self.preview_label.config(image=self.current_preview)
+        self.preview_label.place(relx=0.5, rely=1.0, anchor=tk.S, y=-10)
+
+    def stop_scrubbing(self, event):
+        """Seek to the position the seek bar was released at."""
+        self.scrubbing = False
+        self.preview_label.place_forget()
+        self.seek_video(float(self.seek_bar.get()))
+
+    def skip_video(self, seconds):
+        """Skip forward or backward in the current video."""
+        if self.mediaplayer_capture is not None:
+            self.seek_video(self.mediaplayer_capture.get_pts() + seconds)
+
+    def seek_video(self, position):
+        """Seek the current video to the position in seconds.
+
+        The seek first lands on the keyframe before the position, which is fast, and
+        is refined to the exact frame once no further seek has been requested.
+        """
+        if self.mediaplayer_capture is None:
+            return
+        duration = self.seek_bar.cget("to")
+        position = max(0.0, min(position, duration)) if duration else max(0.0, position)
+        self.seek_media_players(position, accurate=False)
+        self.seek_bar.set(position)
+
+        if self.seek_refine_job is not None:
+            self.root.after_cancel(self.seek_refine_job)
+        self.seek_refine_job = self.root.after(SEEK_REFINE_DELAY, self.refine_seek, position)
+
+    def refine_seek(self, position):
+        """Refine a previous seek to the exact position."""
+        self.seek_refine_job = None
+        if self.mediaplayer_capture is not None:
+            self.seek_media_players(position, accurate=True)
+
+    def seek_media_players(self, position, accurate):
+        """Seek the video and any separate audio player to the position in seconds."""
+        for player in (self.mediaplayer_capture, self.mediaplayer_audio):
+            if player is not None:
+                player.seek(position, relative=False, accurate=accurate)
+
+    def release_media_players(self):
+        """Stop and close the video and any separate audio player."""
+        for player in (self.mediaplayer_capture, self.mediaplayer_audio):
+            if player is not None:
+                player.set_pause(True)
+                player.close_player()
+        self.mediaplayer_capture = None
+        self.mediaplayer_audio = None
+        if self.seek_refine_job is not None:
+            self.root.after_cancel(self.seek_refine_job)
+            self.seek_refine_job = None
+
     def update_video_count_label(self):
         """Update the label showing the current video number and total count."""
         total_videos = len(self.collection_videos)